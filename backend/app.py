@@ -1,7 +1,15 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, stream_with_context
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
 from flask_cors import CORS
+import orjson
+import atexit
+import logging
+import queue
 import sys
 import os
+import time
+from logging.handlers import QueueHandler, QueueListener
 from dotenv import load_dotenv
 from gemini_service import GeminiService
 from command_executor import CommandExecutor
@@ -9,8 +17,62 @@ from command_executor import CommandExecutor
 # Load environment variables
 load_dotenv()
 
+# Log through a queue: the logging thread only merges the message arguments,
+# while the line formatting and the write happen on the listener's thread
+log_level_name = (os.getenv('LOGLEVEL') or 'INFO').upper()
+if log_level_name.isdigit():
+    log_level = int(log_level_name)
+else:
+    # Returns the level number for known names and aliases such as WARN
+    log_level = logging.getLevelName(log_level_name)
+invalid_log_level = not isinstance(log_level, int)
+if invalid_log_level:
+    log_level = logging.INFO
+
+log_queue = queue.Queue(-1)
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+log_listener = QueueListener(log_queue, log_stream_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+root_logger = logging.getLogger()
+root_logger.addHandler(QueueHandler(log_queue))
+root_logger.setLevel(log_level)
+
+logger = logging.getLogger(__name__)
+if invalid_log_level:
+    logger.warning("Invalid LOGLEVEL %r, using INFO", log_level_name)
+
+class ORJSONProvider(JSONProvider):
+    """Serialize JSON requests and responses with orjson"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+app.json = ORJSONProvider(app)
+
+# Only the frontend dev server may call the API unless configured otherwise
+ALLOWED_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv('ALLOWED_ORIGINS', 'http://localhost:5173,http://127.0.0.1:5173').split(',')
+    if origin.strip()
+]
+CORS(app, resources={r"/*": {"origins": ALLOWED_ORIGINS}})
+
+# Compress JSON responses; command output is usually highly compressible
+app.config['COMPRESS_MIMETYPES'] = ['application/json']
+app.config['COMPRESS_LEVEL'] = 4
+app.config['COMPRESS_MIN_SIZE'] = 500
+Compress(app)
+
+def fast_json(obj, status=200):
+    """Build a JSON response directly from orjson bytes, bypassing jsonify"""
+    return Response(orjson.dumps(obj), status=status, mimetype='application/json', direct_passthrough=True)
 
 # Initialize services
 gemini_service = GeminiService()
@@ -23,16 +85,16 @@ def execute_command():
         # Get the command from JSON request
         data = request.get_json()
         if not data or 'cmd' not in data:
-            return jsonify({'error': 'No command provided'}), 400
+            return fast_json({'error': 'No command provided'}, 400)
         
         command = data['cmd'].strip()
         if not command:
-            return jsonify({'error': 'Empty command'}), 400
+            return fast_json({'error': 'Empty command'}, 400)
         
         # Execute the command
         result = command_executor.execute_command(command)
         
-        return jsonify({
+        return fast_json({
             'command': result['command'],
             'return_code': result['return_code'],
             'output': result['output'],
@@ -42,7 +104,29 @@ def execute_command():
         })
         
     except Exception as e:
-        return jsonify({'error': f'Server error: {str(e)}'}), 500
+        return fast_json({'error': f'Server error: {str(e)}'}, 500)
+
+@app.route('/execute/stream', methods=['POST'])
+def execute_command_stream():
+    """Execute a direct terminal command and stream its output as NDJSON"""
+    try:
+        # Get the command from JSON request
+        data = request.get_json()
+        if not data or 'cmd' not in data:
+            return fast_json({'error': 'No command provided'}, 400)
+        
+        command = data['cmd'].strip()
+        if not command:
+            return fast_json({'error': 'Empty command'}, 400)
+        
+        def generate():
+            for frame in command_executor.execute_command_stream(command):
+                yield orjson.dumps(frame) + b'\n'
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+    except Exception as e:
+        return fast_json({'error': f'Server error: {str(e)}'}, 500)
 
 @app.route('/natural-language', methods=['POST'])
 def process_natural_language():
@@ -51,37 +135,37 @@ def process_natural_language():
         # Get the natural language query from JSON request
         data = request.get_json()
         if not data or 'query' not in data:
-            return jsonify({'error': 'No query provided'}), 400
+            return fast_json({'error': 'No query provided'}, 400)
         
         query = data['query'].strip()
         if not query:
-            return jsonify({'error': 'Empty query'}), 400
+            return fast_json({'error': 'Empty query'}, 400)
         
-        print(f"Processing natural language query: {query}")
+        logger.info("Processing natural language query: %s", query)
         
         # Convert natural language to command using Gemini
         converted_command, error = gemini_service.convert_natural_language_to_command(query)
         
         if error:
-            return jsonify({
+            return fast_json({
                 'error': error,
                 'original_query': query,
                 'mode': 'natural_language'
-            }), 400
+            }, 400)
         
         if not converted_command:
-            return jsonify({
+            return fast_json({
                 'error': 'Could not convert query to command',
                 'original_query': query,
                 'mode': 'natural_language'
-            }), 400
+            }, 400)
         
-        print(f"Converted to command: {converted_command}")
+        logger.info("Converted to command: %s", converted_command)
         
         # Execute the converted command
         result = command_executor.execute_command(converted_command)
         
-        return jsonify({
+        return fast_json({
             'original_query': query,
             'converted_command': converted_command,
             'command': result['command'],
@@ -93,21 +177,33 @@ def process_natural_language():
         })
         
     except Exception as e:
-        return jsonify({'error': f'Server error: {str(e)}'}), 500
+        return fast_json({'error': f'Server error: {str(e)}'}, 500)
+
+# Serialized health response, rebuilt at most every HEALTH_TTL seconds
+HEALTH_TTL = 5
+_health_body = b''
+_health_built_at = float('-inf')
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'python_version': sys.version,
-        'working_directory': os.getcwd(),
-        'gemini_configured': gemini_service.is_configured,
-        'services': {
-            'gemini': 'configured' if gemini_service.is_configured else 'not_configured',
-            'command_executor': 'ready'
-        }
-    })
+    global _health_body, _health_built_at
+    
+    now = time.monotonic()
+    if now - _health_built_at > HEALTH_TTL:
+        _health_body = orjson.dumps({
+            'status': 'healthy',
+            'python_version': sys.version,
+            'working_directory': os.getcwd(),
+            'gemini_configured': gemini_service.is_configured,
+            'services': {
+                'gemini': 'configured' if gemini_service.is_configured else 'not_configured',
+                'command_executor': 'ready'
+            }
+        })
+        _health_built_at = now
+    
+    return Response(_health_body, mimetype='application/json')
 
 if __name__ == '__main__':
     print("Starting Enhanced Terminal Backend Server...")
@@ -118,6 +214,7 @@ if __name__ == '__main__':
     print("  - Modular architecture")
     print("Endpoints:")
     print("  POST /execute - Execute direct commands")
+    print("  POST /execute/stream - Execute direct commands with streamed output")
     print("  POST /natural-language - Process natural language queries")
     print("  GET /health - Health check")
     
@@ -1,45 +1,106 @@
+import codecs
+import logging
+import re
+import selectors
+import shlex
+import signal
 import subprocess
 import os
-from typing import Dict, Any
+import threading
+import time
+from typing import Dict, Any, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 65536
+
+# Characters that need a shell to interpret (pipes, redirects, globs, variables...)
+_SHELL_META = re.compile(r'[|&;<>$`\\*?(){}\[\]~#\n]')
+
+# Commands whose output is stable enough to reuse for a short time
+_IDEMPOTENT_COMMANDS = {"pwd", "whoami", "hostname", "uname -a", "id"}
 
 class CommandExecutor:
     def __init__(self):
         self.timeout = 30  # 30 second timeout
+        
+        # (command, cwd) -> (result, cached_at) for _IDEMPOTENT_COMMANDS
+        self._cache = {}
+        self.cache_ttl = 2  # seconds
+    
+    def _spawn(self, command: str, **popen_kwargs) -> subprocess.Popen:
+        """
+        Start a command, skipping the intermediate shell when the command
+        has no shell syntax. Falls back to the shell for builtins, unknown
+        programs and anything shlex cannot split, so errors match the shell's.
+        Each command gets its own process group so it can be killed with its children.
+        """
+        popen_kwargs['start_new_session'] = True
+        if not _SHELL_META.search(command):
+            try:
+                args = shlex.split(command)
+                if args:
+                    return subprocess.Popen(args, cwd=os.getcwd(), **popen_kwargs)
+            except (ValueError, OSError):
+                pass
+        
+        return subprocess.Popen(command, shell=True, cwd=os.getcwd(), **popen_kwargs)
+    
+    def _kill_process_group(self, process: subprocess.Popen) -> None:
+        """Kill a command together with any children it started"""
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
     
     def execute_command(self, command: str) -> Dict[str, Any]:
         """
         Execute a terminal command and return the result.
         Returns a dictionary with execution details.
         """
+        if command not in _IDEMPOTENT_COMMANDS:
+            return self._run_command(command)
+        
+        # Idempotent commands reuse a recent result instead of forking again
+        cache_key = (command, os.getcwd())
+        entry = self._cache.get(cache_key)
+        if entry is not None and time.monotonic() - entry[1] < self.cache_ttl:
+            return dict(entry[0])
+        
+        result = self._run_command(command)
+        self._cache[cache_key] = (result, time.monotonic())
+        return dict(result)
+    
+    def _run_command(self, command: str) -> Dict[str, Any]:
+        """Run a command to completion and collect its output"""
         try:
-            print(f"Executing command: {command}")
+            logger.debug("Executing command: %s", command)
             
             # Execute the command
-            result = subprocess.run(
-                command, 
-                shell=True, 
-                capture_output=True, 
-                text=True, 
-                timeout=self.timeout,
-                cwd=os.getcwd()
-            )
+            process = self._spawn(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            stdout_bytes, stderr_bytes = self._collect_output(process)
+            return_code = process.returncode
+            
+            # Decode once at the end instead of per read
+            stdout = stdout_bytes.decode('utf-8', errors='replace')
+            stderr = stderr_bytes.decode('utf-8', errors='replace')
             
             # Prepare response
             response_data = {
                 'command': command,
-                'return_code': result.returncode,
-                'output': result.stdout if result.stdout else '',
-                'error': result.stderr if result.stderr else '',
-                'success': result.returncode == 0
+                'return_code': return_code,
+                'output': stdout if stdout else '',
+                'error': stderr if stderr else '',
+                'success': return_code == 0
             }
             
             # If there's an error (non-zero return code), include it
-            if result.returncode != 0:
-                if result.stderr:
-                    response_data['output'] = result.stderr
-                    response_data['error'] = f"Command failed with return code {result.returncode}"
+            if return_code != 0:
+                if stderr:
+                    response_data['output'] = stderr
+                    response_data['error'] = f"Command failed with return code {return_code}"
                 else:
-                    response_data['output'] = f"Command failed with return code {result.returncode}"
+                    response_data['output'] = f"Command failed with return code {return_code}"
             
             return response_data
             
@@ -59,4 +120,110 @@ class CommandExecutor:
                 'output': f'Failed to execute command: {str(e)}',
                 'error': str(e),
                 'success': False
-            }
\ No newline at end of file
+            }
+    
+    def _collect_output(self, process: subprocess.Popen) -> Tuple[bytes, bytes]:
+        """
+        Read stdout and stderr from the raw pipes in READ_CHUNK_SIZE blocks until
+        the process exits. Kills its process group and raises TimeoutExpired
+        past the timeout.
+        """
+        stdout_fd = process.stdout.fileno()
+        stderr_fd = process.stderr.fileno()
+        buffers = {stdout_fd: bytearray(), stderr_fd: bytearray()}
+        deadline = time.monotonic() + self.timeout
+        
+        try:
+            with selectors.DefaultSelector() as selector:
+                for fd in buffers:
+                    selector.register(fd, selectors.EVENT_READ)
+                
+                while selector.get_map():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise subprocess.TimeoutExpired(process.args, self.timeout)
+                    
+                    for key, _ in selector.select(remaining):
+                        data = os.read(key.fd, READ_CHUNK_SIZE)
+                        if data:
+                            buffers[key.fd] += data
+                        else:
+                            selector.unregister(key.fd)
+            
+            process.wait(timeout=max(deadline - time.monotonic(), 0))
+        
+        except subprocess.TimeoutExpired:
+            self._kill_process_group(process)
+            process.wait()
+            raise
+        
+        finally:
+            process.stdout.close()
+            process.stderr.close()
+        
+        return bytes(buffers[stdout_fd]), bytes(buffers[stderr_fd])
+    
+    def execute_command_stream(self, command: str) -> Iterator[Dict[str, Any]]:
+        """
+        Execute a terminal command and yield its output as it is produced.
+        Yields {'chunk': text} frames followed by a final frame with the return code.
+        """
+        logger.debug("Executing command (streaming): %s", command)
+        
+        try:
+            process = self._spawn(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                bufsize=READ_CHUNK_SIZE
+            )
+        except Exception as e:
+            yield {'return_code': -1, 'error': str(e), 'success': False}
+            return
+        
+        timed_out = threading.Event()
+        
+        def on_timeout():
+            # Only a process still running at the deadline counts as timed out,
+            # but children that outlived it are killed either way
+            if process.poll() is None:
+                timed_out.set()
+            self._kill_process_group(process)
+        
+        timer = threading.Timer(self.timeout, on_timeout)
+        timer.start()
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        
+        try:
+            # read1 returns whatever is available, so output reaches the client early
+            while True:
+                data = process.stdout.read1(READ_CHUNK_SIZE)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text:
+                    yield {'chunk': text}
+            
+            text = decoder.decode(b'', final=True)
+            if text:
+                yield {'chunk': text}
+            
+            return_code = process.wait()
+            timer.cancel()
+            if timed_out.is_set():
+                yield {
+                    'return_code': -1,
+                    'error': f'Command timed out ({self.timeout} seconds)',
+                    'success': False
+                }
+                return
+            
+            yield {'return_code': return_code, 'success': return_code == 0}
+        
+        finally:
+            # Also runs when the client disconnects mid-stream
+            timer.cancel()
+            if process.poll() is None:
+                self._kill_process_group(process)
+                process.wait()
+            process.stdout.close()
\ No newline at end of file
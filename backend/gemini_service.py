@@ -1,10 +1,104 @@
+import functools
 import os
-import requests
-import json
+import orjson
+import urllib3
 import re
+import time
+from collections import OrderedDict
 from typing import Tuple, Optional
 
+try:
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # semantic cache is optional
+    np = None
+    SentenceTransformer = None
+
+try:
+    import gevent.monkey
+    from gevent import get_hub
+except ImportError:  # only needed when served by gevent workers
+    get_hub = None
+
+DANGEROUS_PATTERNS = [
+    r'\brm\s+-rf\s+/',
+    r'\bformat\b',
+    r'\bdel\s+/[sq]',
+    r'>\s*/dev/sd[a-z]',
+    r'\bdd\s+if=.*of=/dev/',
+    r'\bshutdown\b',
+    r'\breboot\b',
+    r'\bhalt\b',
+]
+
+# Every pattern above requires a '/' or a 't' (case-insensitively), so commands
+# with neither can skip the regex
+_DANGER_CHARS = frozenset('/tT')
+
+# Fail at import rather than let commands bypass a new pattern. Escapes and
+# character classes are ignored since they do not require a literal character.
+for _pattern in DANGEROUS_PATTERNS:
+    if _DANGER_CHARS.isdisjoint(re.sub(r'\\.|\[[^\]]*\]', '', _pattern)):
+        raise ValueError(f"Dangerous pattern {_pattern!r} has no literal character from _DANGER_CHARS")
+
+# Static part of the prompt shared by every request
+PROMPT_INSTRUCTIONS = """
+Convert the following natural language request into a single, appropriate terminal/shell command. 
+Only respond with the command itself, no explanations or additional text.
+
+Examples:
+- "show me all files in current directory" -> "ls -la"
+- "what's my current location" -> "pwd"
+- "create a new folder called test" -> "mkdir test"
+- "show running processes" -> "ps aux"
+- "check disk usage" -> "df -h"
+- "find all python files" -> "find . -name "*.py""
+- "show current date and time" -> "date"
+- "show system information" -> "uname -a"
+- "list all directories" -> "ls -d */"
+- "show file contents of readme.txt" -> "cat readme.txt"
+"""
+
+# Invariant text around the user's request, joined once at import time
+_PROMPT_PREFIX = PROMPT_INSTRUCTIONS + "\nRequest: "
+_PROMPT_SUFFIX = "\n\nCommand:"
+
+# generateContent body around the JSON-encoded prompt text, so each request
+# only encodes the prompt instead of building and serializing nested dicts
+_PAYLOAD_PREFIX = b'{"contents":[{"parts":[{"text":'
+_PAYLOAD_SUFFIX = b'}]}]}'
+
+# Query tokens: quoted strings or runs of non-space characters. Semantic cache
+# hits must agree on every non-filler token, in order and with case preserved,
+# otherwise "copy b.txt to a.txt" or "delete folder build" could reuse the
+# command cached for "copy a.txt to b.txt" or "delete folder Build".
+_TOKEN_RE = re.compile(r'"[^"]*"|\'[^\']*\'|[^\s"\']+')
+_FILLER_WORDS = frozenset({"a", "an", "the", "please", "can", "could", "would", "you", "i", "me"})
+
+# Opening (with optional language tag) and closing markdown code fences
+_FENCE_RE = re.compile(r'^```[^\n]*\n|\n```\s*$', re.MULTILINE)
+
 class GeminiService:
+    # Queries that map deterministically to a command and skip the API entirely
+    _FAST_PATH = {
+        "pwd": "pwd",
+        "where am i": "pwd",
+        "what is my current location": "pwd",
+        "what's my current location": "pwd",
+        "date": "date",
+        "current date and time": "date",
+        "show current date and time": "date",
+        "whoami": "whoami",
+        "who am i": "whoami",
+        "show system info": "uname -a",
+        "show system information": "uname -a",
+        "list files": "ls -la",
+        "show me all files in current directory": "ls -la",
+        "list all directories": "ls -d */",
+        "show running processes": "ps aux",
+        "check disk usage": "df -h",
+    }
+    
     def __init__(self):
         self.api_key = os.getenv("GEMINI_API_KEY")
         self.url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
@@ -13,35 +107,68 @@ class GeminiService:
             "X-goog-api-key": self.api_key
         }
         self.is_configured = self.api_key is not None
+        
+        # Reuse connections to the Gemini API across requests
+        self._http = urllib3.PoolManager(maxsize=16, headers=self.headers, retries=False)
+        self._timeout = urllib3.Timeout(connect=2, read=10)
+        
+        # Single compiled alternation so each check is one scan
+        self._danger_re = re.compile("|".join(f"(?:{p})" for p in DANGEROUS_PATTERNS), re.IGNORECASE)
+        
+        # LRU cache of whitespace-normalized query -> (command, inserted_at)
+        self._cache = OrderedDict()
+        self.cache_maxsize = 1024
+        self.cache_ttl = 3600  # 1 hour
+        
+        # Optional semantic cache for near-duplicate queries
+        self.semantic_cache_enabled = (
+            os.getenv("GEMINI_SEMANTIC_CACHE", "").lower() in ("1", "true", "yes")
+            and SentenceTransformer is not None
+        )
+        self.semantic_threshold = 0.97
+        self.semantic_maxsize = 10000
+        self._embedder = None
+        self._emb_matrix = None
+        self._cached_commands = []
+        self._cached_tokens = []
+        if self.semantic_cache_enabled:
+            self._embedder = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+            self._emb_matrix = np.empty((0, self._embedder.get_sentence_embedding_dimension()), dtype=np.float32)
     
     def convert_natural_language_to_command(self, text: str) -> Tuple[Optional[str], Optional[str]]:
         """
         Convert natural language to terminal command using Gemini API.
         Returns (command, error_message)
         """
+        fast_path_command = self._FAST_PATH.get(text.strip().lower().rstrip('?'))
+        if fast_path_command is not None:
+            return fast_path_command, None
+        
         if not self.is_configured:
             return None, "Gemini API is not configured. Please set GEMINI_API_KEY in environment variables."
         
+        # Only collapse whitespace: case can matter for file names in the query
+        cache_key = " ".join(text.split())
+        cached_command = self._get_cached_command(cache_key)
+        if cached_command is not None:
+            return cached_command, None
+        
+        query_embedding = None
+        if self.semantic_cache_enabled:
+            query_embedding = self._embed(cache_key)
+            tokens = self._significant_tokens(text)
+            cached_command = self._get_semantic_match(query_embedding, tokens)
+            if cached_command is not None:
+                self._cache_command(cache_key, cached_command)
+                return cached_command, None
+        
         try:
-            prompt = self._build_prompt(text)
-            payload = {
-                "contents": [
-                    {
-                        "parts": [
-                            {
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ]
-            }
-            
-            response = requests.post(self.url, headers=self.headers, json=payload, timeout=10)
+            response = self._post(self.url, self._build_payload(text))
             
-            if response.status_code != 200:
-                return None, f"Gemini API error: {response.status_code} - {response.text}"
+            if response.status != 200:
+                return None, f"Gemini API error: {response.status} - {response.data.decode('utf-8', 'replace')}"
             
-            result = response.json()
+            result = orjson.loads(response.data)
             
             if 'candidates' not in result or not result['candidates']:
                 return None, "No response from Gemini API"
@@ -53,64 +180,105 @@ class GeminiService:
             if self._is_dangerous_command(command):
                 return None, "Command rejected for safety reasons."
             
+            if command:
+                self._cache_command(cache_key, command)
+                if query_embedding is not None:
+                    self._add_semantic_entry(query_embedding, tokens, command)
             return command, None
             
-        except requests.exceptions.Timeout:
+        except urllib3.exceptions.NewConnectionError as e:
+            # Subclasses ConnectTimeoutError, so must come before the timeout case
+            return None, f"Network error: {str(e)}"
+        except urllib3.exceptions.TimeoutError:
             return None, "Gemini API request timed out"
-        except requests.exceptions.RequestException as e:
+        except urllib3.exceptions.HTTPError as e:
             return None, f"Network error: {str(e)}"
         except Exception as e:
             return None, f"Error converting natural language: {str(e)}"
     
+    def _post(self, url: str, body: bytes) -> urllib3.BaseHTTPResponse:
+        """POST an encoded JSON body to the Gemini API over the pooled connection"""
+        return self._http.request("POST", url, body=body, timeout=self._timeout)
+    
+    def _build_payload(self, text: str) -> bytes:
+        """Encode the generateContent body for a request"""
+        return b"".join((_PAYLOAD_PREFIX, orjson.dumps(self._build_prompt(text)), _PAYLOAD_SUFFIX))
+    
+    def _get_cached_command(self, key: str) -> Optional[str]:
+        """Return a cached command for the query, or None if missing or expired"""
+        entry = self._cache.pop(key, None)
+        if entry is None:
+            return None
+        
+        command, inserted_at = entry
+        if time.monotonic() - inserted_at > self.cache_ttl:
+            return None
+        
+        # Reinsert to mark as most recently used
+        self._cache[key] = entry
+        return command
+    
+    def _cache_command(self, key: str, command: str) -> None:
+        """Store a converted command, evicting the least recently used entry"""
+        self._cache[key] = (command, time.monotonic())
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_maxsize:
+            self._cache.popitem(last=False)
+    
+    def _embed(self, text: str):
+        """Embed a query as a unit-length float32 vector"""
+        encode = functools.partial(self._embedder.encode, text, convert_to_numpy=True, normalize_embeddings=True)
+        if get_hub is not None and gevent.monkey.is_module_patched('socket'):
+            # encode() is CPU-bound; run it on a native thread so the gevent loop keeps serving
+            embedding = get_hub().threadpool.apply(encode)
+        else:
+            embedding = encode()
+        return embedding.astype(np.float32)
+    
+    def _significant_tokens(self, text: str) -> Tuple[str, ...]:
+        """Return the query's tokens in order, without filler words or trailing punctuation"""
+        tokens = (token.rstrip('?!.,') for token in _TOKEN_RE.findall(text))
+        return tuple(token for token in tokens if token and token.lower() not in _FILLER_WORDS)
+    
+    def _get_semantic_match(self, query_embedding, tokens: Tuple[str, ...]) -> Optional[str]:
+        """
+        Return the command of the most similar cached query above the threshold
+        whose significant tokens match the query's exactly.
+        """
+        if not self._cached_commands:
+            return None
+        
+        # Embeddings are normalized, so the dot product is the cosine similarity
+        similarities = self._emb_matrix @ query_embedding
+        candidates = np.flatnonzero(similarities >= self.semantic_threshold)
+        for index in candidates[np.argsort(-similarities[candidates])]:
+            if self._cached_tokens[index] == tokens:
+                return self._cached_commands[index]
+        return None
+    
+    def _add_semantic_entry(self, query_embedding, tokens: Tuple[str, ...], command: str) -> None:
+        """Store a query embedding and its command, evicting the oldest entry"""
+        self._emb_matrix = np.vstack([self._emb_matrix, query_embedding])
+        self._cached_tokens.append(tokens)
+        self._cached_commands.append(command)
+        if len(self._cached_commands) > self.semantic_maxsize:
+            self._emb_matrix = self._emb_matrix[1:]
+            self._cached_tokens.pop(0)
+            self._cached_commands.pop(0)
+    
     def _build_prompt(self, text: str) -> str:
         """Build the prompt for Gemini API"""
-        return f"""
-Convert the following natural language request into a single, appropriate terminal/shell command. 
-Only respond with the command itself, no explanations or additional text.
-
-Examples:
-- "show me all files in current directory" -> "ls -la"
-- "what's my current location" -> "pwd"
-- "create a new folder called test" -> "mkdir test"
-- "show running processes" -> "ps aux"
-- "check disk usage" -> "df -h"
-- "find all python files" -> "find . -name "*.py""
-- "show current date and time" -> "date"
-- "show system information" -> "uname -a"
-- "list all directories" -> "ls -d */"
-- "show file contents of readme.txt" -> "cat readme.txt"
-
-Request: {text}
-
-Command:"""
+        return "".join((_PROMPT_PREFIX, text, _PROMPT_SUFFIX))
     
     def _clean_command_response(self, command_text: str) -> str:
         """Clean up the Gemini response"""
-        # Remove any markdown formatting or extra text
-        command = re.sub(r'^```.*?\n', '', command_text)
-        command = re.sub(r'\n```$', '', command_text)
-        command = command.strip()
-        
-        # Remove any explanatory text (take only the first line if multiple lines)
-        command = command.split('\n')[0].strip()
-        
-        return command
+        # Remove any markdown code fences, then keep only the first line
+        # in case the model added explanatory text
+        command = _FENCE_RE.sub('', command_text).strip()
+        return command.split('\n', 1)[0].strip()
     
     def _is_dangerous_command(self, command: str) -> bool:
         """Check if command is potentially dangerous"""
-        dangerous_patterns = [
-            r'\brm\s+-rf\s+/',
-            r'\bformat\b',
-            r'\bdel\s+/[sq]',
-            r'>\s*/dev/sd[a-z]',
-            r'\bdd\s+if=.*of=/dev/',
-            r'\bshutdown\b',
-            r'\breboot\b',
-            r'\bhalt\b',
-        ]
-        
-        for pattern in dangerous_patterns:
-            if re.search(pattern, command, re.IGNORECASE):
-                return True
-        
-        return False
\ No newline at end of file
+        if _DANGER_CHARS.isdisjoint(command):
+            return False
+        return self._danger_re.search(command) is not None
\ No newline at end of file
@@ -0,0 +1,8 @@
+# Gunicorn configuration for serving the backend with cooperative workers.
+# gevent patches sockets and subprocess pipes so blocking Gemini calls and
+# command execution yield to other requests instead of tying up a worker.
+bind = "0.0.0.0:5000"
+workers = 4
+worker_class = "gevent"
+worker_connections = 100
+timeout = 60